@@ -0,0 +1,269 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "faker",
+#     "fastapi",
+#     "httpx",
+#     "numpy",
+#     "pillow",
+#     "python-dateutil",
+#     "requests",
+# ]
+# ///
+"""Benchmarks the task functions in main.py across dataset scales.
+
+Usage:
+    python benchmark.py --scales 1 10 100 --fast
+    python benchmark.py --baseline benchmark-baseline.json      # flag regressions
+    python benchmark.py --save-baseline benchmark-baseline.json # record a new baseline
+    python benchmark.py --startup                               # time-to-first-request
+    python benchmark.py --llm-base http://localhost:8001        # use llm_standin.py instead of the stub
+
+For every scale, datasets are generated with datagen.py into a temporary directory.
+Each task function then runs in a fresh process with that directory as its working
+directory and with LLM calls stubbed (or sent to --llm-base), recording wall time, CPU time, peak RSS and
+throughput. Results are written as JSON.
+
+--startup instead measures how long `import main` takes and how long a fresh uvicorn
+server takes to answer its first request.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import datagen
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Number of input items each task processes at scale 1 (see the get_* functions in datagen.py)
+TASKS = {
+    "count_weekdays": 1000,
+    "sort_contacts": 100,
+    "extract_recent_log_lines": 50,
+    "extract_markdown_titles": 100,
+    "extract_email": 1,
+    "find_most_similar_comments": 100,
+    "compute_gold_ticket_sales": 1000,
+}
+# email.txt is a single message at every scale
+UNSCALED_TASKS = {"extract_email"}
+EMBEDDING_DIMENSIONS = 64
+
+
+def generate(root, email, scale, fast):
+    datagen.config.update({"root": os.path.join(root, "data"), "email": email, "scale": scale, "fast": fast})
+    os.makedirs(datagen.config["root"], exist_ok=True)
+    datagen.run_generators(datagen.GENERATORS)
+
+
+def fake_embedding(text):
+    """A deterministic unit vector per text, standing in for a real embedding."""
+    import numpy as np
+
+    seed = int(hashlib.sha256(text.encode()).hexdigest(), 16) % (2**32)
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_chat_completion(messages, model=None, category=None, **kwargs):
+    """Stands in for llm.gateway.chat_completion without touching the network."""
+    content = messages[-1]["content"]
+    if isinstance(content, str) and content.startswith("Generate embeddings for these comments: "):
+        comments = json.loads(content.split(": ", 1)[1])
+        content = json.dumps({"embeddings": [fake_embedding(c) for c in comments]})
+    else:
+        content = "stub"
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+
+
+def call_task(main, task):
+    if task == "count_weekdays":
+        return main.count_weekdays("Wednesday", "/data/dates.txt", "/data/dates-wednesdays.txt")
+    return getattr(main, task)()
+
+
+def run_task(task, workdir, repeat, results, llm_base=None):
+    """Runs in a child process so peak RSS is measured per task."""
+    os.environ.setdefault("AIPROXY_TOKEN", "benchmark")
+    if llm_base:
+        os.environ["OPENAI_API_BASE"] = llm_base
+    os.chdir(workdir)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import main
+
+        if not llm_base:
+            main.gateway.chat_completion = fake_chat_completion
+        baseline_rss = peak_rss_mb()
+        walls, cpus = [], []
+        for _ in range(repeat):
+            wall, cpu = time.perf_counter(), time.process_time()
+            call_task(main, task)
+            walls.append(time.perf_counter() - wall)
+            cpus.append(time.process_time() - cpu)
+    peak = peak_rss_mb()
+    results.put({
+        "wall_s": min(walls),
+        "wall_mean_s": sum(walls) / len(walls),
+        "cpu_s": min(cpus),
+        "peak_rss_mb": peak,
+        "rss_growth_mb": None if peak is None else peak - baseline_rss,
+    })
+
+
+def measure(task, workdir, repeat, llm_base=None):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=run_task, args=(task, workdir, repeat, results, llm_base))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        return {"error": f"exited with code {proc.exitcode}"}
+    return results.get()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_startup(repeat, timeout=60):
+    """Times `import main` and a fresh server's time-to-first-request, in separate processes."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "AIPROXY_TOKEN": os.environ.get("AIPROXY_TOKEN", "benchmark")}
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], cwd=here, env=env, check=True)
+        import_s = time.perf_counter() - start
+
+        port = free_port()
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=here, env=env,
+        )
+        try:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with code {server.returncode}")
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"server did not answer within {timeout}s")
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            first_request_s = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+        results.append({"import_s": import_s, "first_request_s": first_request_s})
+    return {
+        "task": "startup",
+        "scale": 0,
+        "import_s": min(r["import_s"] for r in results),
+        # wall_s lets --baseline flag startup regressions like any other task
+        "wall_s": min(r["first_request_s"] for r in results),
+        "wall_mean_s": sum(r["first_request_s"] for r in results) / len(results),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Returns the results whose wall time regressed by more than `threshold` (a fraction)."""
+    previous = {(r["task"], r["scale"]): r for r in baseline["results"] if "wall_s" in r}
+    regressions = []
+    for r in results:
+        before = previous.get((r["task"], r["scale"]))
+        if before and "wall_s" in r and r["wall_s"] > before["wall_s"] * (1 + threshold):
+            regressions.append({**r, "baseline_wall_s": before["wall_s"], "slowdown": r["wall_s"] / before["wall_s"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main.py task functions across dataset scales")
+    parser.add_argument("--email", default="bench@example.com", help="Email used to seed datagen")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="Dataset scale factors")
+    parser.add_argument("--fast", action="store_true", help="Use datagen's fast mode for generation")
+    parser.add_argument("--tasks", nargs="+", choices=list(TASKS), default=list(TASKS), help="Tasks to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per task; the best is reported")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write results")
+    parser.add_argument("--baseline", help="Compare against this results file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline file")
+    parser.add_argument("--startup", action="store_true", help="Measure import and time-to-first-request instead")
+    parser.add_argument("--llm-base", help="Send LLM calls to this API base (e.g. llm_standin.py) instead of stubbing them")
+    args = parser.parse_args()
+
+    results = []
+    if args.startup:
+        result = measure_startup(args.repeat)
+        print(f"  import main {result['import_s'] * 1000:10.1f} ms  first request {result['wall_s'] * 1000:10.1f} ms")
+        results.append(result)
+    for scale in ([] if args.startup else args.scales):
+        with tempfile.TemporaryDirectory(prefix=f"bench-{scale}-") as workdir:
+            start = time.perf_counter()
+            generate(workdir, args.email, scale, args.fast)
+            print(f"scale={scale}: generated data in {time.perf_counter() - start:.2f}s")
+            for task in args.tasks:
+                result = {"task": task, "scale": scale, "items": TASKS[task] if task in UNSCALED_TASKS else TASKS[task] * scale}
+                result.update(measure(task, workdir, args.repeat, args.llm_base))
+                if "wall_s" in result:
+                    result["items_per_s"] = result["items"] / result["wall_s"] if result["wall_s"] else None
+                    print(f"  {task:<28} {result['wall_s'] * 1000:10.1f} ms  cpu {result['cpu_s'] * 1000:10.1f} ms"
+                          f"  rss {result['peak_rss_mb'] or 0:8.1f} MB")
+                else:
+                    print(f"  {task:<28} FAILED: {result['error']}")
+                results.append(result)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "email": args.email,
+            "fast": args.fast,
+            "repeat": args.repeat,
+            "llm_base": args.llm_base,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['task']} scale={r['scale']}: {r['baseline_wall_s'] * 1000:.1f} ms -> "
+                  f"{r['wall_s'] * 1000:.1f} ms ({r['slowdown']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@
 
 import datetime
 import hashlib
+import itertools
 import json
 import os
 import random
@@ -20,18 +21,44 @@ import time
 from PIL import Image, ImageDraw, ImageFont
 from faker import Faker
 
-config = {"root": "C:/Users/Supraja/IITM/TDS/TDS_Project_1/TDS_Project_1/data"}
+config = {"root": "C:/Users/Supraja/IITM/TDS/TDS_Project_1/TDS_Project_1/data", "scale": 1, "fast": False}
 
 
 def num(str):
     return int(hashlib.sha256(str.encode()).hexdigest(), 16) % (2**32)
 
 
+def fake_pool(email, key, make, size=1000):
+    """Pre-generate `size` Faker values, to sample from instead of calling Faker per row.
+
+    Used by fast mode (--fast) so large --scale datasets stay deterministic per email
+    without paying for millions of Faker calls.
+    """
+    fake = Faker()
+    fake.seed_instance(num(f"{email}:{key}:pool"))
+    return [make(fake) for _ in range(size)]
+
+
 def write_file(path, content):
     with open(os.path.join(config["root"], path), "w", encoding="utf-8") as f:
         f.write(content)
 
 
+def write_files(files, mtimes=None):
+    """Write many (path, content) pairs, creating each parent directory only once.
+
+    If mtimes is given, it maps a path to the (atime, mtime) to set after writing.
+    """
+    paths = [os.path.join(config["root"], path) for path, _ in files]
+    for dirname in {os.path.dirname(path) for path in paths}:
+        os.makedirs(dirname, exist_ok=True)
+    for path, (name, content) in zip(paths, files):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        if mtimes and name in mtimes:
+            os.utime(path, mtimes[name])
+
+
 def get_markdown(email):
     return f"""#Unformatted Markdown
 
@@ -56,7 +83,7 @@ def a2_format_markdown():
     write_file("format.md", get_markdown(config["email"]))
 
 
-def get_dates(email):
+def get_dates(email, scale=1):
     random.seed(f"{email}:a3", version=2)
     start_date = datetime.datetime(2000, 1, 1)
     end_date = datetime.datetime(2024, 12, 31)
@@ -66,14 +93,14 @@ def get_dates(email):
         "%b %d, %Y",  # Mar 14, 2024
         "%Y/%m/%d %H:%M:%S",  # 2024/03/14 15:30:45
     ]
-    timestamps = random.sample(range(int(start_date.timestamp()), int(end_date.timestamp())), 1000)
+    timestamps = random.sample(range(int(start_date.timestamp()), int(end_date.timestamp())), 1000 * scale)
     return [
         datetime.datetime.fromtimestamp(ts).strftime(random.choice(formats)) for ts in timestamps
     ]
 
 
 def a3_dates():
-    """Save 1,000 random non-unique dates between 2000-01-01 and 2024-12-31 at dates.txt
+    """Save 1,000 (times scale) random non-unique dates between 2000-01-01 and 2024-12-31 at dates.txt
 
     Generates dates in various unambiguous formats:
     - ISO 8601: yyyy-mm-dd
@@ -81,31 +108,53 @@ def a3_dates():
     - MMM dd, yyyy
     - yyyy/mm/dd HH:MM:SS
     """
-    dates = get_dates(config["email"])
+    dates = get_dates(config["email"], config["scale"])
     write_file("dates.txt", "\n".join(dates))
 
 
-def get_contacts(email):
+def get_contacts(email, scale=1, fast=False):
+    if fast:
+        rng = random.Random(f"{email}:a4")
+        first_names = fake_pool(email, "a4:first", lambda fake: fake.first_name())
+        last_names = fake_pool(email, "a4:last", lambda fake: fake.last_name())
+        domains = fake_pool(email, "a4:domain", lambda fake: fake.free_email_domain(), 20)
+        contacts = []
+        for i in range(100 * scale):
+            first_name, last_name = rng.choice(first_names), rng.choice(last_names)
+            contacts.append({
+                "first_name": first_name,
+                "last_name": last_name,
+                "email": f"{first_name}.{last_name}{i}@{rng.choice(domains)}".lower(),
+            })
+        return contacts
     fake = Faker()
     fake.seed_instance(num(f"{email}:a4"))
     return [
         {"first_name": fake.first_name(), "last_name": fake.last_name(), "email": fake.email()}
-        for _ in range(100)
+        for _ in range(100 * scale)
     ]
 
 
 def a4_contacts():
-    """Generate a JSON with 100 contacts with random first_name, last_name, and email"""
-    contacts = get_contacts(config["email"])
+    """Generate a JSON with 100 (times scale) contacts with random first_name, last_name, and email"""
+    contacts = get_contacts(config["email"], config["scale"], config["fast"])
     write_file("contacts.json", json.dumps(contacts))
 
 
-def get_logs(email):
+def get_logs(email, scale=1, fast=False):
     files = []
+    if fast:
+        rng = random.Random(f"{email}:a5")
+        texts = fake_pool(email, "a5", lambda fake: fake.text())
+        for i in range(50 * scale):
+            text = "\n".join(rng.choices(texts, k=10))
+            age = rng.randint(1, 24 * 60 * 60 * 365)
+            files.append((age, text))
+        return files
     random.seed(f"{email}:a5", version=2)
     fake = Faker()
     fake.seed_instance(num(f"{email}:a5"))
-    for i in range(50):
+    for i in range(50 * scale):
         text = "\n".join([fake.text() for _ in range(10)])
         age = random.randint(1, 24 * 60 * 60 * 365)
         files.append((age, text))
@@ -113,21 +162,38 @@ def get_logs(email):
 
 
 def a5_logs():
-    """Generate 50 log files with 10 lines each of random content at logs/"""
+    """Generate 50 (times scale) log files with 10 lines each of random content at logs/"""
     email = config["email"]
-    os.makedirs(os.path.join(config["root"], "logs"), exist_ok=True)
     now = time.time()
-    for i, (age, text) in enumerate(get_logs(email)):
-        write_file(f"logs/log-{i}.log", text)
-        os.utime(os.path.join(config["root"], f"logs/log-{i}.log"), (now - age, now - age))
+    files, mtimes = [], {}
+    for i, (age, text) in enumerate(get_logs(email, config["scale"], config["fast"])):
+        files.append((f"logs/log-{i}.log", text))
+        mtimes[f"logs/log-{i}.log"] = (now - age, now - age)
+    write_files(files, mtimes)
 
 
-def get_docs(email):
+def get_docs(email, scale=1, fast=False):
     files = []
+    if fast:
+        rng = random.Random(f"{email}:a6")
+        words = fake_pool(email, "a6:word", lambda fake: fake.word())
+        texts = fake_pool(email, "a6:text", lambda fake: fake.text())
+        sentences = fake_pool(email, "a6:sentence", lambda fake: fake.sentence())
+        for i in range(10 * scale):
+            dir = f"{rng.choice(words)}-{i}"
+            for j in range(10):
+                file = f"{rng.choice(words)}-{j}"
+                prefix = "\n".join(rng.choices(texts, k=rng.randint(0, 10)))
+                heading = f"# {rng.choice(sentences)}"
+                suffix = "\n".join(rng.choices(texts, k=rng.randint(0, 10)))
+                files.append((dir, file, "\n".join([prefix, heading, suffix])))
+        return files
     random.seed(f"{email}:a6", version=2)
     fake = Faker()
     fake.seed_instance(num(f"{email}:a6"))
-    for dir in fake.words(10):
+    for i, dir in enumerate(fake.words(10 * scale)):
+        # Faker's word list is small, so keep directories distinct when scaled up
+        dir = f"{dir}-{i}" if scale > 1 else dir
         for file in fake.words(10):
             prefix = "\n".join([fake.text() for _ in range(random.randint(0, 10))])
             heading = f"# {fake.sentence()}"
@@ -138,14 +204,10 @@ def get_docs(email):
 
 
 def a6_docs():
-    """Generate 10 Markdown files each under 10 random subdirectories with random content."""
+    """Generate 10 Markdown files each under 10 (times scale) random subdirectories with random content."""
     email = config["email"]
-    docs = get_docs(email)
-    os.makedirs(os.path.join(config["root"], "docs"), exist_ok=True)
-    for dir, file, text in docs:
-        dirname = os.path.join(config["root"], "docs", dir)
-        os.makedirs(dirname, exist_ok=True)
-        write_file(os.path.join(dirname, f"{file}.md"), text)
+    docs = get_docs(email, config["scale"], config["fast"])
+    write_files([(f"docs/{dir}/{file}.md", text) for dir, file, text in docs])
 
 
 def get_email(email):
@@ -230,28 +292,38 @@ def a8_credit_card_image():
     image.save(os.path.join(config["root"], "credit_card.png"))
 
 
-def get_comments(email):
+def get_comments(email, scale=1, fast=False):
+    if fast:
+        rng = random.Random(f"{email}:a9")
+        paragraphs = fake_pool(email, "a9", lambda fake: fake.paragraph())
+        return rng.choices(paragraphs, k=100 * scale)
     fake = Faker()
     fake.seed_instance(num(f"{email}:a9"))
-    return [fake.paragraph() for _ in range(100)]
+    return [fake.paragraph() for _ in range(100 * scale)]
 
 
 def a9_comments():
-    """Generate a comments.txt file with 100 random comments"""
-    write_file("comments.txt", "\n".join(get_comments(config["email"])))
+    """Generate a comments.txt file with 100 (times scale) random comments"""
+    write_file("comments.txt", "\n".join(get_comments(config["email"], config["scale"], config["fast"])))
 
 
-def get_tickets(email):
-    random.seed(f"{email}:a10", version=2)
+def iter_tickets(email, scale=1):
+    rng = random.Random(f"{email}:a10")
     ticket_types = ["Gold", "Silver", "Bronze"]
-    return [
-        (random.choice(ticket_types), random.randint(1, 10), round(random.uniform(50, 150), 2))
-        for _ in range(1000)
-    ]
+    for _ in range(1000 * scale):
+        yield (rng.choice(ticket_types), rng.randint(1, 10), round(rng.uniform(50, 150), 2))
+
+
+def get_tickets(email, scale=1):
+    return list(iter_tickets(email, scale))
 
 
 def a10_ticket_sales():
-    """Generate ticket-sales.db with a tickets(type, units, price) table. 1 row per ticket"""
+    """Generate ticket-sales.db with a tickets(type, units, price) table. 1 row per ticket
+
+    Rows are streamed in batches inside a single transaction, so large scales never
+    hold the whole table in memory.
+    """
     target = os.path.join(config["root"], "ticket-sales.db")
     if os.path.exists(target):
         os.remove(target)
@@ -266,34 +338,95 @@ def a10_ticket_sales():
         )
     """
     )
-    cursor.executemany("INSERT INTO tickets VALUES (?, ?, ?)", get_tickets(config["email"]))
+    tickets = iter_tickets(config["email"], config["scale"])
+    while batch := list(itertools.islice(tickets, 100_000)):
+        cursor.executemany("INSERT INTO tickets VALUES (?, ?, ?)", batch)
     conn.commit()
     conn.close()
 
 
+GENERATORS = [
+    a2_format_markdown,
+    a3_dates,
+    a4_contacts,
+    a5_logs,
+    a6_docs,
+    a7_email,
+    a8_credit_card_image,
+    a9_comments,
+    a10_ticket_sales,
+]
+
+
+def select_generators(only=None, skip=None):
+    """Pick generators by full name (a3_dates) or by task id (a3)."""
+
+    def matches(fn, names):
+        return any(fn.__name__ == name or fn.__name__.split("_")[0] == name for name in names)
+
+    known = {fn.__name__ for fn in GENERATORS} | {fn.__name__.split("_")[0] for fn in GENERATORS}
+    unknown = set(only or []) | set(skip or [])
+    unknown -= known
+    if unknown:
+        raise ValueError(f"Unknown generators: {', '.join(sorted(unknown))}")
+    return [
+        fn
+        for fn in GENERATORS
+        if (not only or matches(fn, only)) and not (skip and matches(fn, skip))
+    ]
+
+
+def init_worker(worker_config):
+    config.update(worker_config)
+
+
+def run_generator(name):
+    globals()[name]()
+    return name
+
+
+def run_generators(generators, jobs=1):
+    """Run generators one after another, or in a process pool if jobs > 1.
+
+    Each generator is seeded from the email alone, so the output does not depend
+    on the order or the process they run in.
+    """
+    if jobs <= 1 or len(generators) <= 1:
+        for fn in generators:
+            fn()
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(dict(config),)) as pool:
+        for name in pool.map(run_generator, [fn.__name__ for fn in generators]):
+            print("Generated", name)
+
+
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser()
     parser.add_argument("email")
     parser.add_argument("--root", default="C:/Users/Supraja/IITM/TDS/TDS_Project_1/TDS_Project_1/data")
+    parser.add_argument("--only", nargs="+", help="Only generate these artifacts (e.g. a3 a5_logs)")
+    parser.add_argument("--skip", nargs="+", help="Skip these artifacts (e.g. a8)")
+    parser.add_argument("--jobs", type=int, default=1, help="Generate artifacts in N parallel processes")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply the size of every dataset by N")
+    parser.add_argument("--fast", action="store_true", help="Sample from pre-generated Faker values (for large scales)")
     args = parser.parse_args()
     config["email"] = args.email
+    config["scale"] = args.scale
+    config["fast"] = args.fast
     config["root"] = os.path.abspath(args.root)
 
+    try:
+        generators = select_generators(args.only, args.skip)
+    except ValueError as e:
+        parser.error(str(e))
+
     os.makedirs(config["root"], exist_ok=True)
 
     print("DISCLAIMER: THIS SCRIPT WILL CHANGE BEFORE THE EVALUATION. TREAT THIS AS A GUIDE.")
     print("Files created at", config["root"])
 
-    a2_format_markdown()
-    a3_dates()
-    a4_contacts()
-    a5_logs()
-    a6_docs()
-    a7_email()
-    a8_credit_card_image()
-    a9_comments()
-    a10_ticket_sales()
-
-# DISCLAIMER: THIS SCRIPT WILL CHANGE BEFORE THE EVALUATION. TREAT THIS AS A GUIDE.
+    run_generators(generators, args.jobs)
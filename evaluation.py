@@ -8,6 +8,7 @@
 #     "python-dateutil",
 # ]
 # ///
+import asyncio
 import hashlib
 import httpx
 import json
@@ -16,6 +17,7 @@ import numpy as np
 import os
 import re
 import subprocess
+import time
 from dateutil.parser import parse
 from datagen import (
     get_markdown,
@@ -32,6 +34,27 @@ from datagen import (
 
 openai_api_base = os.getenv("OPENAI_API_BASE", "https://aiproxy.sanand.workers.dev/openai/v1")
 openai_api_key = os.getenv("OPENAI_API_KEY")
+server_url = os.getenv("EVAL_SERVER_URL", "http://localhost:8000")
+
+# One pooled client shared by every request; see get_client()
+_client = None
+
+
+def get_client(max_connections: int = 100):
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 def num(str):
@@ -44,35 +67,51 @@ def mismatch(msg, expected, result):
 
 
 async def run(task: str):
-    async with httpx.AsyncClient(timeout=30) as client:
-        logging.warning(f"🟡 Running task: {task.strip()}")
-        response = await client.post("http://localhost:8000/run", params={"task": task})
-        try:
-            response_text = json.dumps(response.json(), indent=2)
-        except json.JSONDecodeError:
-            response_text = response.text
-        if response.status_code < 400:
-            logging.info(f"🟢 HTTP {response.status_code} {response_text}")
-        else:
-            logging.error(f"🔴 HTTP {response.status_code} {response_text}")
-        return response.status_code, response_text
+    logging.warning(f"🟡 Running task: {task.strip()}")
+    response = await get_client().post(f"{server_url}/run", params={"task": task})
+    try:
+        response_text = json.dumps(response.json(), indent=2)
+    except json.JSONDecodeError:
+        response_text = response.text
+    if response.status_code < 400:
+        logging.info(f"🟢 HTTP {response.status_code} {response_text}")
+    else:
+        logging.error(f"🔴 HTTP {response.status_code} {response_text}")
+    return response.status_code, response_text
 
 
 async def read(path: str):
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.get(f"http://localhost:8000/read?path={path}")
-        if response.status_code != 200:
-            raise Exception(f"Cannot read {path}")
-        return response.text
+    response = await get_client().get(f"{server_url}/read", params={"path": path})
+    if response.status_code != 200:
+        raise Exception(f"Cannot read {path}")
+    return response.text
 
 
-async def a1(email: str, **kwargs):
-    await run(
-        f"""
+# Task prompts, shared by the checks below and by the load test
+PROMPTS = {
+    "a1": lambda email, **kwargs: f"""
 Install `uv` (if required) and run the script `https://raw.githubusercontent.com/sanand0/tools-in-data-science-public/tds-2025-01/datagen.py`
 with `{email}` as the only argument
-"""
-    )
+""",
+    "a2": lambda email, file="/data/format.md", **kwargs: f"""
+Format the contents of `{file}` using `prettier@3.4.2`, updating the file in-place
+""",
+    "a3": lambda email, **kwargs: "The file `/data/dates.txt` contains a list of dates, one per line. Count the number of Wednesdays in the list, and write just the number to `/data/dates-wednesdays.txt`",
+    "a4": lambda email, **kwargs: "Sort the array of contacts in `/data/contacts.json` by `last_name`, then `first_name`, and write the result to `/data/contacts-sorted.json`",
+    "a5": lambda email, **kwargs: "Write the first line of the 10 most recent `.log` file in `/data/logs/` to `/data/logs-recent.txt`, most recent first",
+    "a6": lambda email, **kwargs: """Find all Markdown (`.md`) files in `/data/docs/`.
+For each file, extract the first occurrance of each H1 (i.e. a line starting with `# `).
+Create an index file `/data/docs/index.json` that maps each filename (without the `/data/docs/` prefix) to its title
+(e.g. `{"README.md": "Home", "path/to/large-language-models.md": "Large Language Models", ...}`)""",
+    "a7": lambda email, **kwargs: "`/data/email.txt` contains an email message. Pass the content to an LLM with instructions to extract the sender's email address, and write just the email address to `/data/email-sender.txt`",
+    "a8": lambda email, **kwargs: "`/data/credit_card.png` contains a credit card number. Pass the image to an LLM, have it extract the card number, and write it without spaces to `/data/credit-card.txt`",
+    "a9": lambda email, **kwargs: "`/data/comments.txt` contains a list of comments, one per line. Using embeddings, find the most similar pair of comments and write them to `/data/comments-similar.txt`, one per line",
+    "a10": lambda email, **kwargs: 'The SQLite database file `/data/ticket-sales.db` has a `tickets` with columns `type`, `units`, and `price`. Each row is a customer bid for a concert ticket. What is the total sales of all the items in the "Gold" ticket type? Write the number in `/data/ticket-sales-gold.txt`',
+}
+
+
+async def a1(email: str, **kwargs):
+    await run(PROMPTS["a1"](email))
     return email in await read("/data/format.md")
 
 
@@ -87,11 +126,7 @@ async def a2(email: str, file: str = "/data/format.md", **kwargs):
         # Ensure npx is picked up from the PATH on Windows
         shell=True,
     ).stdout
-    result = await run(
-        f"""
-Format the contents of `{file}` using `prettier@3.4.2`, updating the file in-place
-"""
-    )
+    result = await run(PROMPTS["a2"](email, file=file))
     result = await read(file)
     if result != expected:
         return mismatch(file, expected, result)
@@ -100,9 +135,7 @@ Format the contents of `{file}` using `prettier@3.4.2`, updating the file in-pla
 
 async def a3(email, **kwargs):
     dates = get_dates(email)
-    await run(
-        "The file `/data/dates.txt` contains a list of dates, one per line. Count the number of Wednesdays in the list, and write just the number to `/data/dates-wednesdays.txt`"
-    )
+    await run(PROMPTS["a3"](email))
     result = await read("/data/dates-wednesdays.txt")
     expected = sum(1 for date in dates if parse(date).weekday() == 2)
     if result.strip() != str(expected):
@@ -113,9 +146,7 @@ async def a3(email, **kwargs):
 async def a4(email, **kwargs):
     contacts = get_contacts(email)
     contacts.sort(key=lambda c: (c["last_name"], c["first_name"]))
-    await run(
-        "Sort the array of contacts in `/data/contacts.json` by `last_name`, then `first_name`, and write the result to `/data/contacts-sorted.json`"
-    )
+    await run(PROMPTS["a4"](email))
     result = await read("/data/contacts-sorted.json")
     try:
         result = json.loads(result)
@@ -131,9 +162,7 @@ async def a5(email, **kwargs):
     files = get_logs(email)
     files.sort(key=lambda f: f[0])
     expected = "".join([f[1].split("\n")[0] + "\n" for f in files[:10]])
-    await run(
-        "Write the first line of the 10 most recent `.log` file in `/data/logs/` to `/data/logs-recent.txt`, most recent first"
-    )
+    await run(PROMPTS["a5"](email))
     result = await read("/data/logs-recent.txt")
     if result.strip() != expected.strip():
         return mismatch("/data/logs-recent.txt", expected, result)
@@ -143,12 +172,7 @@ async def a5(email, **kwargs):
 # TODO: Verify after datagen
 async def a6(email, **kwargs):
     docs = get_docs(email)
-    await run(
-        """Find all Markdown (`.md`) files in `/data/docs/`.
-For each file, extract the first occurrance of each H1 (i.e. a line starting with `# `).
-Create an index file `/data/docs/index.json` that maps each filename (without the `/data/docs/` prefix) to its title
-(e.g. `{"README.md": "Home", "path/to/large-language-models.md": "Large Language Models", ...}`)"""
-    )
+    await run(PROMPTS["a6"](email))
     expected = {}
     for dir, file, text in docs:
         # get the first line starting with #
@@ -170,9 +194,7 @@ Create an index file `/data/docs/index.json` that maps each filename (without th
 
 async def a7(email, **kwargs):
     expected = get_email(email)["from_email"]
-    await run(
-        "`/data/email.txt` contains an email message. Pass the content to an LLM with instructions to extract the sender's email address, and write just the email address to `/data/email-sender.txt`"
-    )
+    await run(PROMPTS["a7"](email))
     result = await read("/data/email-sender.txt")
     if result != expected:
         return mismatch("/data/email-sender.txt", expected, result)
@@ -181,9 +203,7 @@ async def a7(email, **kwargs):
 
 async def a8(email, **kwargs):
     data = get_credit_card(email)
-    await run(
-        "`/data/credit_card.png` contains a credit card number. Pass the image to an LLM, have it extract the card number, and write it without spaces to `/data/credit-card.txt`"
-    )
+    await run(PROMPTS["a8"](email))
     result = await read("/data/credit-card.txt")
     if re.sub(r"\D", "", result) != re.sub(r"\D", "", data["number"]):
         return mismatch("/data/credit-card.txt", data["number"], result)
@@ -192,12 +212,11 @@ async def a8(email, **kwargs):
 
 async def a9(email, **kwargs):
     data = get_comments(email)
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.post(
-            f"{openai_api_base}/embeddings",
-            headers={"Authorization": f"Bearer {openai_api_key}"},
-            json={"model": "text-embedding-3-small", "input": data},
-        )
+    response = await get_client().post(
+        f"{openai_api_base}/embeddings",
+        headers={"Authorization": f"Bearer {openai_api_key}"},
+        json={"model": "text-embedding-3-small", "input": data},
+    )
     embeddings = np.array([emb["embedding"] for emb in response.json()["data"]])
     similarity = np.dot(embeddings, embeddings.T)
     # Create mask to ignore diagonal (self-similarity)
@@ -205,9 +224,7 @@ async def a9(email, **kwargs):
     # Get indices of maximum similarity
     i, j = np.unravel_index(similarity.argmax(), similarity.shape)
     expected = "\n".join(sorted([data[i], data[j]]))
-    await run(
-        "`/data/comments.txt` contains a list of comments, one per line. Using embeddings, find the most similar pair of comments and write them to `/data/comments-similar.txt`, one per line"
-    )
+    await run(PROMPTS["a9"](email))
     result = await read("/data/comments-similar.txt")
     sorted_result = "\n".join(sorted([line for line in result.split("\n") if line.strip()]))
     if sorted_result != expected:
@@ -217,9 +234,7 @@ async def a9(email, **kwargs):
 
 async def a10(email, **kwargs):
     data = get_tickets(email)
-    await run(
-        'The SQLite database file `/data/ticket-sales.db` has a `tickets` with columns `type`, `units`, and `price`. Each row is a customer bid for a concert ticket. What is the total sales of all the items in the "Gold" ticket type? Write the number in `/data/ticket-sales-gold.txt`'
-    )
+    await run(PROMPTS["a10"](email))
     result = await read("/data/ticket-sales-gold.txt")
     expected = sum(row[1] * row[2] for row in data if row[0].lower() == "gold")
     try:
@@ -232,31 +247,116 @@ async def a10(email, **kwargs):
     return True
 
 
+async def check(task, email: str):
+    try:
+        success = await task(email=email)
+    except Exception as e:
+        logging.error(f"🔴 {task.__name__.upper()} failed: {e}")
+        success = False
+    if success:
+        logging.info(f"✅ {task.__name__.upper()} PASSED")
+    else:
+        logging.error(f"❌ {task.__name__.upper()} FAILED")
+    return success
+
+
 async def main(email: str):
-    score, total = 0, 0
-    for task in [a1,a2,a3]:
-        total += 1
-        try:
-            success = await task(email=email)
-        except Exception as e:
-            logging.error(f"🔴 {task.__name__.upper()} failed: {e}")
-            success = False
-        if success:
-            logging.info(f"✅ {task.__name__.upper()} PASSED")
-        else:
-            logging.error(f"❌ {task.__name__.upper()} FAILED")
-        score += 1 if success else 0
-    logging.info(f"🎯 Score: {score} / {total}")
+    tasks = [a1, a2, a3]
+    try:
+        # a1 generates the data every other task reads, so it must finish first.
+        # The remaining checks read and write disjoint files and can run concurrently.
+        results = [await check(a1, email)] if a1 in tasks else []
+        results += await asyncio.gather(*(check(task, email) for task in tasks if task is not a1))
+    finally:
+        await close_client()
+    logging.info(f"🎯 Score: {sum(results)} / {len(tasks)}")
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q)) * 1000 if latencies else None
+
+
+async def load_test(email, task_names, requests, concurrency, rps=None):
+    """Replays task prompts against /run and reports latency, errors and throughput per task.
+
+    Requests cycle through the tasks. At most `concurrency` requests are in flight;
+    with `rps`, requests are also started at that fixed rate.
+
+    The server holds one dataset (generated for its USER_EMAIL) and the a3-a10 prompts
+    only name /data paths, so every repeat of a task is the same request. After the
+    first one the server answers classification from its cache, so this measures
+    task execution under load, not the LLM classification step.
+    """
+    client = get_client(max_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {name: {"latencies": [], "errors": 0} for name in task_names}
+    async def fire(name):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{server_url}/run", params={"task": PROMPTS[name](email)})
+                failed = response.status_code >= 400
+            except httpx.HTTPError as e:
+                logging.debug(f"🔴 {name}: {e}")
+                failed = True
+            stats[name]["latencies"].append(time.perf_counter() - start)
+            stats[name]["errors"] += failed
+
+    started = time.perf_counter()
+    pending = []
+    for i in range(requests):
+        if rps:
+            await asyncio.sleep(max(0, started + i / rps - time.perf_counter()))
+        pending.append(asyncio.create_task(fire(task_names[i % len(task_names)])))
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    await close_client()
+
+    report = {"requests": requests, "elapsed_s": elapsed, "throughput_rps": requests / elapsed, "tasks": {}}
+    for name, stat in stats.items():
+        latencies = stat["latencies"]
+        report["tasks"][name] = {
+            "requests": len(latencies),
+            "errors": stat["errors"],
+            "error_rate": stat["errors"] / len(latencies) if latencies else None,
+            "throughput_rps": len(latencies) / elapsed,
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "p99_ms": percentile_ms(latencies, 99),
+        }
+    return report
 
 
 if __name__ == "__main__":
-    import asyncio
     import argparse
 
     parser = argparse.ArgumentParser(description="Evaluate tasks with configurable logging")
     parser.add_argument("--email", default="user@example.com", help="Set the email address")
     levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
     parser.add_argument("--log-level", default="INFO", choices=levels, help="Set logging level")
+    load = parser.add_argument_group("load test")
+    load.add_argument("--load-test", action="store_true", help="Replay task prompts instead of checking results")
+    load.add_argument("--tasks", nargs="+", choices=list(PROMPTS), default=[f"a{i}" for i in range(3, 11)],
+                      help="Tasks to replay (a1 regenerates data and is excluded by default)")
+    load.add_argument("--requests", type=int, default=100, help="Total number of requests")
+    load.add_argument("--concurrency", type=int, default=10, help="Maximum requests in flight")
+    load.add_argument("--rps", type=float, help="Target request rate (default: as fast as concurrency allows)")
+    load.add_argument("--report", help="Write the load test report as JSON to this file")
     args = parser.parse_args()
     logging.basicConfig(level=args.log_level, format="%(message)s\n")
-    asyncio.run(main(args.email))
\ No newline at end of file
+
+    if not args.load_test:
+        asyncio.run(main(args.email))
+    else:
+        logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request is too noisy here
+        report = asyncio.run(load_test(args.email, args.tasks, args.requests, args.concurrency, args.rps))
+        for name, stat in report["tasks"].items():
+            if stat["requests"]:
+                logging.info(
+                    f"{name:>4}: {stat['requests']} req, {stat['error_rate']:.1%} errors, {stat['throughput_rps']:.1f} req/s, "
+                    f"p50 {stat['p50_ms']:.0f} ms, p95 {stat['p95_ms']:.0f} ms, p99 {stat['p99_ms']:.0f} ms"
+                )
+        logging.info(f"🎯 {report['requests']} requests in {report['elapsed_s']:.1f}s ({report['throughput_rps']:.1f} req/s)")
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,38 @@
+"""Gunicorn settings for serving the API from several worker processes.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is loaded once in the master (preload_app) and main.warmup() runs there
+before any worker is forked, so workers start with the heavy task dependencies
+imported and the search index built. Each worker is a uvicorn event loop with its
+own LLM connection pool, caches and metrics; /metrics reports the worker that
+served it. Task outputs are written atomically under file locks (see storage.py),
+so workers running the same task don't corrupt each other's files.
+
+Environment:
+    PORT                 port to bind (8000)
+    WEB_CONCURRENCY      number of workers (one per CPU)
+    DATA_ROOT            local directory that /data/... maps to (./data)
+    TASK_WATCH_DATA=1    every worker watches DATA_ROOT and precomputes its own results
+"""
+import multiprocessing
+import os
+import time
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# datagen and Prettier runs can take minutes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "600"))
+graceful_timeout = 30
+accesslog = "-"
+
+
+def when_ready(server):
+    import main
+
+    start = time.perf_counter()
+    indexed = main.warmup()
+    server.log.info(f"Warmed up in {time.perf_counter() - start:.2f}s; {indexed['documents']} document(s) indexed")
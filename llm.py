@@ -0,0 +1,253 @@
+"""Gateway for every LLM call made by the task runner.
+
+All chat completion and embedding requests go through one LLMGateway, which keeps
+pooled keep-alive connections (one sync and one async httpx client), applies
+timeouts, retries transient failures with jittered exponential backoff, caps the
+number of requests in flight, and accounts tokens and latency per task category.
+The cap is shared by sync callers (threads) and async callers (any event loop), so
+max_concurrency holds for the process however the requests are made.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+from metrics import LLM_REQUEST_SECONDS, LLM_RETRIES, LLM_TOKENS, current_task
+
+
+DEFAULT_API_BASE = "http://aiproxy.sanand.workers.dev/openai/v1"
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class SharedLimit:
+    """A counting semaphore that threads and coroutines on any event loop can share."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._held = 0
+        self._cond = threading.Condition()
+        self._waiters = []  # (loop, future) of coroutines waiting for a slot
+
+    def __enter__(self):
+        with self._cond:
+            while self._held >= self.limit:
+                self._cond.wait()
+            self._held += 1
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._held -= 1
+            self._cond.notify()
+            waiters, self._waiters = self._waiters, []
+        # Every waiting coroutine retries; the ones that lose the race wait again
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                pass  # Its loop has closed
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._held < self.limit:
+                    self._held += 1
+                    return
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._cond:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+                raise
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(None)
+
+
+class LLMGateway:
+    def __init__(self, api_base=None, api_key=None, timeout=60, max_retries=3,
+                 max_concurrency=16, max_connections=32, backoff=0.5, max_backoff=8.0):
+        # OPENAI_API_BASE points every LLM call elsewhere, e.g. at llm_standin.py
+        self.api_base = api_base or os.getenv("OPENAI_API_BASE", DEFAULT_API_BASE)
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._client = None
+        self._async_clients = {}
+        self._limit = SharedLimit(max_concurrency)
+        self._lock = threading.Lock()
+        self._usage = {}
+
+    def configure(self, api_base=None, api_key=None):
+        if api_base:
+            self.api_base = api_base
+        if api_key:
+            self.api_key = api_key
+
+    # 🔹 Connection pools
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _sync_client(self):
+        with self._lock:
+            if self._client is None:
+                import httpx
+
+                self._client = httpx.Client(timeout=self.timeout, limits=self._limits())
+            return self._client
+
+    def _async_client(self):
+        """An async client for the running event loop (they can't be shared across loops)."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import httpx
+
+            client = self._async_clients[loop] = httpx.AsyncClient(timeout=self.timeout, limits=self._limits())
+        return client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    # 🔹 Requests
+
+    def _headers(self):
+        api_key = self.api_key or os.getenv("AIPROXY_TOKEN")
+        if not api_key:
+            raise LLMError("AIPROXY_TOKEN is not set. Please set it in the environment variables.")
+        return {"Authorization": f"Bearer {api_key}"}
+
+    def _delay(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _should_retry(self, attempt, response=None, error=None):
+        if attempt >= self.max_retries:
+            return False
+        return error is not None or response.status_code in RETRY_STATUSES
+
+    def post(self, path, payload, category=None):
+        """POSTs to the API with retries and returns the parsed JSON body."""
+        import httpx
+
+        category = category or current_task.get()
+        client = self._sync_client()
+        headers = self._headers()
+        start = time.perf_counter()
+        with self._limit:
+            for attempt in range(self.max_retries + 1):
+                response, error = None, None
+                try:
+                    response = client.post(f"{self.api_base}{path}", headers=headers, json=payload)
+                except httpx.TransportError as e:
+                    error = e
+                if self._should_retry(attempt, response, error):
+                    LLM_RETRIES.inc(category=category)
+                    time.sleep(self._delay(attempt, response))
+                    continue
+                return self._finish(category, start, response, error)
+
+    async def apost(self, path, payload, category=None):
+        """Async version of post()."""
+        import httpx
+
+        category = category or current_task.get()
+        client = self._async_client()
+        headers = self._headers()
+        start = time.perf_counter()
+        async with self._limit:
+            for attempt in range(self.max_retries + 1):
+                response, error = None, None
+                try:
+                    response = await client.post(f"{self.api_base}{path}", headers=headers, json=payload)
+                except httpx.TransportError as e:
+                    error = e
+                if self._should_retry(attempt, response, error):
+                    LLM_RETRIES.inc(category=category)
+                    await asyncio.sleep(self._delay(attempt, response))
+                    continue
+                return self._finish(category, start, response, error)
+
+    def _finish(self, category, start, response, error):
+        seconds = time.perf_counter() - start
+        failed = error is not None or response.status_code >= 400
+        LLM_REQUEST_SECONDS.observe(seconds, category=category, outcome="failure" if failed else "success")
+        body = {} if failed else response.json()
+        self._account(category, seconds, failed, body.get("usage") or {})
+        if error is not None:
+            raise LLMError(f"LLM request failed: {error}")
+        if failed:
+            raise LLMError(f"LLM request failed with HTTP {response.status_code}: {response.text[:500]}")
+        return body
+
+    def _account(self, category, seconds, failed, usage):
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.inc(usage[kind], category=category, kind=kind)
+        with self._lock:
+            stats = self._usage.setdefault(category, {
+                "requests": 0, "failures": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            stats["requests"] += 1
+            stats["failures"] += failed
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            stats["completion_tokens"] += usage.get("completion_tokens", 0)
+
+    def usage(self):
+        """Requests, failures, latency and tokens so far, per task category."""
+        with self._lock:
+            return {category: dict(stats) for category, stats in self._usage.items()}
+
+    # 🔹 Endpoints
+
+    def chat_completion(self, messages, model="gpt-4o-mini", category=None, **kwargs):
+        return self.post("/chat/completions", {"model": model, "messages": messages, **kwargs}, category)
+
+    async def achat_completion(self, messages, model="gpt-4o-mini", category=None, **kwargs):
+        return await self.apost("/chat/completions", {"model": model, "messages": messages, **kwargs}, category)
+
+    def embeddings(self, inputs, model="text-embedding-3-small", category=None):
+        return self.post("/embeddings", {"model": model, "input": inputs}, category)
+
+    async def aembeddings(self, inputs, model="text-embedding-3-small", category=None):
+        return await self.apost("/embeddings", {"model": model, "input": inputs}, category)
+
+
+def message_content(response):
+    """The stripped text of the first choice of a chat completion."""
+    return response["choices"][0]["message"]["content"].strip()
+
+
+gateway = LLMGateway()
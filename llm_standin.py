@@ -0,0 +1,169 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "fastapi",
+#     "httpx",
+#     "uvicorn",
+# ]
+# ///
+"""A local stand-in for the AI Proxy's chat completions and embeddings endpoints.
+
+Usage:
+    python llm_standin.py --mode record --port 8001        # proxy to the AI Proxy and save fixtures
+    python llm_standin.py --port 8001                      # replay the saved fixtures offline
+    python llm_standin.py --latency 0.3 --error-rate 0.1   # replay with injected latency and errors
+
+Then point the server and the evaluator at it:
+    OPENAI_API_BASE=http://localhost:8001 uvicorn main:app
+    OPENAI_API_BASE=http://localhost:8001 python evaluation.py
+
+Fixtures are keyed by a hash of the request path and JSON body and stored one per
+file as <hash>.json in --fixtures. In replay mode a request without a fixture gets a
+404; in record mode it is forwarded upstream and the response is saved (requests
+that already have a fixture are still replayed). Injected errors use --error-status
+(503 by default) so clients exercise their retry logic.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+config = {
+    "mode": os.getenv("LLM_STANDIN_MODE", "replay"),
+    "fixtures": os.getenv("LLM_STANDIN_FIXTURES", "llm-fixtures"),
+    "upstream": os.getenv("LLM_STANDIN_UPSTREAM", "http://aiproxy.sanand.workers.dev/openai/v1"),
+    "latency": float(os.getenv("LLM_STANDIN_LATENCY", 0)),
+    "jitter": float(os.getenv("LLM_STANDIN_JITTER", 0)),
+    "error_rate": float(os.getenv("LLM_STANDIN_ERROR_RATE", 0)),
+    "error_status": int(os.getenv("LLM_STANDIN_ERROR_STATUS", 503)),
+}
+stats = {"hits": 0, "misses": 0, "recorded": 0, "injected_errors": 0}
+stats_lock = threading.Lock()
+rng = random.Random(os.getenv("LLM_STANDIN_SEED"))
+
+app = FastAPI()
+upstream_client = None
+
+
+def request_hash(path, body):
+    canonical = json.dumps({"path": path, "body": body}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def fixture_path(key):
+    return os.path.join(config["fixtures"], f"{key}.json")
+
+
+def load_fixture(key):
+    try:
+        with open(fixture_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_fixture(key, fixture):
+    os.makedirs(config["fixtures"], exist_ok=True)
+    # Write then rename so a concurrent replay never reads a half-written fixture
+    tmp = f"{fixture_path(key)}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, indent=2)
+    os.replace(tmp, fixture_path(key))
+
+
+def count(name):
+    with stats_lock:
+        stats[name] += 1
+
+
+def error_response(status, message, type):
+    return JSONResponse({"error": {"message": message, "type": type}}, status_code=status)
+
+
+async def record(path, body, authorization):
+    global upstream_client
+    if upstream_client is None:
+        import httpx
+
+        upstream_client = httpx.AsyncClient(timeout=120)
+    token = os.getenv("AIPROXY_TOKEN")
+    headers = {"Authorization": authorization or f"Bearer {token}"}
+    response = await upstream_client.post(f"{config['upstream']}{path}", headers=headers, json=body)
+    return {"request": {"path": path, "body": body}, "status": response.status_code, "response": response.json()}
+
+
+async def handle(path, request: Request):
+    body = await request.json()
+    key = request_hash(path, body)
+
+    # 🔹 Injected latency and errors apply to every request, recorded or not
+    delay = config["latency"] + rng.uniform(-config["jitter"], config["jitter"])
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if config["error_rate"] and rng.random() < config["error_rate"]:
+        count("injected_errors")
+        return error_response(config["error_status"], "Injected error", "injected_error")
+
+    fixture = load_fixture(key)
+    if fixture is not None:
+        count("hits")
+    elif config["mode"] == "record":
+        fixture = await record(path, body, request.headers.get("Authorization"))
+        if fixture["status"] < 400:
+            save_fixture(key, fixture)
+            count("recorded")
+    else:
+        count("misses")
+        return error_response(404, f"No recorded response for request {key}", "fixture_missing")
+    return JSONResponse(fixture["response"], status_code=fixture["status"], headers={"X-Fixture": key})
+
+
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    return await handle("/chat/completions", request)
+
+
+@app.post("/embeddings")
+async def embeddings(request: Request):
+    return await handle("/embeddings", request)
+
+
+@app.get("/stats")
+def get_stats():
+    with stats_lock:
+        return {**stats, "mode": config["mode"], "fixtures": config["fixtures"]}
+
+
+@app.on_event("shutdown")
+async def close_upstream_client():
+    if upstream_client is not None:
+        await upstream_client.aclose()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the AI Proxy")
+    parser.add_argument("--mode", choices=["replay", "record"], default=config["mode"], help="Replay fixtures or record new ones")
+    parser.add_argument("--fixtures", default=config["fixtures"], help="Directory of recorded responses")
+    parser.add_argument("--upstream", default=config["upstream"], help="API base to record from")
+    parser.add_argument("--latency", type=float, default=config["latency"], help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=config["jitter"], help="Random +/- seconds around --latency")
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=config["error_status"], help="HTTP status of injected errors")
+    parser.add_argument("--seed", help="Seed for injected latency and errors")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    config.update({k: getattr(args, k) for k in ("mode", "fixtures", "upstream", "latency", "jitter", "error_rate", "error_status")})
+    if args.seed is not None:
+        rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port)
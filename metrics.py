@@ -0,0 +1,123 @@
+"""Minimal Prometheus-style metrics for the task runner.
+
+Counters and histograms are kept in memory and rendered in the Prometheus text
+exposition format by render() (served on /metrics). phase() times a block of a
+task, labelled with the task set by track_task(), so a slow /run can be broken
+down into classify, execute, read_inputs, write_outputs and external time.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+current_task = contextvars.ContextVar("current_task", default="unclassified")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        with self._lock:
+            series = self._values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram("task_request_seconds", "End-to-end /run latency per task", ("task",))
+PHASE_SECONDS = Histogram("task_phase_seconds", "Time spent in each phase of a task", ("task", "phase"))
+CLASSIFICATIONS = Counter("task_classifications_total", "Tasks classified, by category", ("category",))
+FAILURES = Counter("task_failures_total", "Task failures, by task and the phase that failed", ("task", "phase"))
+EXTERNAL_COMMAND_SECONDS = Histogram("external_command_seconds", "Duration of external commands", ("tool", "outcome"))
+LLM_REQUEST_SECONDS = Histogram("llm_request_seconds", "LLM request latency including retries", ("category", "outcome"))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used, by category and kind", ("category", "kind"))
+LLM_RETRIES = Counter("llm_retries_total", "LLM requests retried after a transient failure", ("category",))
+WARM_HITS = Counter("task_warm_hits_total", "Task runs answered from outputs precomputed by the data watcher", ("task",))
+
+
+@contextmanager
+def track_task(task):
+    """Labels every phase() inside the block with `task`."""
+    token = current_task.set(task)
+    try:
+        yield
+    finally:
+        current_task.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Times a block as one phase of the current task, counting it as failed if it raises."""
+    start = time.perf_counter()
+    task = current_task.get()
+    try:
+        yield
+    except BaseException:
+        FAILURES.inc(task=task, phase=name)
+        raise
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - start, task=task, phase=name)
+
+
+def render():
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,98 @@
+// Long-lived Prettier worker used by main.py's format_md.
+//
+// Speaks line-delimited JSON over stdin/stdout so Node startup and Prettier
+// module loading are paid once instead of on every format request.
+//
+// On startup it writes one line:
+//   {"ready": true, "version": "3.4.2"}   or   {"ready": false, "error": "..."}
+//
+// Requests (one JSON object per line):
+//   {"id": 1, "op": "format", "files": ["/abs/a.md", ...], "options": {...}}
+//   {"id": 2, "op": "version"}
+//
+// Responses (one JSON object per line, same id):
+//   {"id": 1, "ok": true, "results": [{"path": "/abs/a.md", "changed": true}, ...]}
+//   {"id": 1, "ok": false, "error": "..."}
+
+const fs = require("fs");
+const path = require("path");
+const readline = require("readline");
+const { pathToFileURL } = require("url");
+
+function send(obj) {
+  process.stdout.write(JSON.stringify(obj) + "\n");
+}
+
+async function loadPrettier() {
+  // Prefer an explicit module path, then a local node_modules, then global installs.
+  const explicit = process.env.PRETTIER_MODULE;
+  const resolved = explicit
+    ? explicit
+    : require.resolve("prettier", { paths: [process.cwd(), __dirname] });
+  return import(pathToFileURL(resolved).href);
+}
+
+async function formatFile(prettier, file, options) {
+  const source = await fs.promises.readFile(file, "utf8");
+  const config = (await prettier.resolveConfig(file)) || {};
+  const output = await prettier.format(source, { ...config, ...options, filepath: file });
+  if (output !== source) {
+    await fs.promises.writeFile(file, output, "utf8");
+  }
+  return { path: file, changed: output !== source };
+}
+
+async function handle(prettier, request) {
+  if (request.op === "version") {
+    return { id: request.id, ok: true, version: prettier.version };
+  }
+  if (request.op === "format") {
+    const options = request.options || {};
+    const results = [];
+    for (const file of request.files || []) {
+      try {
+        results.push(await formatFile(prettier, path.resolve(file), options));
+      } catch (err) {
+        results.push({ path: file, error: String((err && err.message) || err) });
+      }
+    }
+    return { id: request.id, ok: true, results };
+  }
+  return { id: request.id, ok: false, error: `Unknown op: ${request.op}` };
+}
+
+async function main() {
+  let prettier;
+  try {
+    const mod = await loadPrettier();
+    prettier = mod.default || mod;
+  } catch (err) {
+    send({ ready: false, error: String((err && err.message) || err) });
+    process.exit(1);
+  }
+  send({ ready: true, version: prettier.version });
+
+  const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+  // Requests are handled strictly in order; main.py sends one at a time.
+  let queue = Promise.resolve();
+  rl.on("line", (line) => {
+    if (!line.trim()) return;
+    queue = queue.then(async () => {
+      let request;
+      try {
+        request = JSON.parse(line);
+      } catch (err) {
+        send({ id: null, ok: false, error: "Invalid JSON request" });
+        return;
+      }
+      try {
+        send(await handle(prettier, request));
+      } catch (err) {
+        send({ id: request.id, ok: false, error: String((err && err.message) || err) });
+      }
+    });
+  });
+  rl.on("close", () => queue.then(() => process.exit(0)));
+}
+
+main();
@@ -0,0 +1,136 @@
+"""Opt-in memory profiling for task runs.
+
+memory_profile() wraps a task in tracemalloc and a background sampler that tracks
+RSS and takes a snapshot whenever traced memory reaches a new high, so the top
+allocation sites reported are the ones live at (or near) the peak rather than
+whatever survives until the task returns. Recent profiles are kept in memory for
+the /debug/memory endpoint.
+
+tracemalloc is process-wide and slows allocation-heavy code down noticeably, so
+profiled runs are serialized and should only be enabled while investigating.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+SAMPLE_INTERVAL = 0.05  # seconds
+TOP_ALLOCATIONS = 10
+
+recent_profiles = collections.deque(maxlen=100)
+profile_lock = threading.Lock()
+
+
+def enabled_by_default():
+    return os.getenv("TASK_PROFILE_MEMORY", "").lower() in ("1", "true", "yes")
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where it can't be read cheaply."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Not the current RSS, but the process peak is the best we have without /proc
+        # ru_maxrss is in KiB on Linux, bytes on macOS
+        multiplier = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * multiplier
+    return None
+
+
+def _top_allocations(snapshot, limit):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, __file__),
+    ])
+    return [
+        {
+            "file": stat.traceback[0].filename,
+            "line": stat.traceback[0].lineno,
+            "size_bytes": stat.size,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_rss = current_rss_bytes()
+        self.peak_traced = 0
+        self.peak_snapshot = None
+
+    def sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+        current, _ = tracemalloc.get_traced_memory()
+        # Only snapshot on a meaningful new high; snapshots are not cheap
+        if current > self.peak_traced * 1.1:
+            self.peak_traced = current
+            self.peak_snapshot = tracemalloc.take_snapshot()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+
+@contextmanager
+def memory_profile(task, top=TOP_ALLOCATIONS, interval=SAMPLE_INTERVAL):
+    """Profiles the memory used inside the block; yields a dict filled in on exit."""
+    report = {}
+    with profile_lock:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline_traced, _ = tracemalloc.get_traced_memory()
+        baseline_rss = current_rss_bytes()
+        sampler = _Sampler(interval)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield report
+        finally:
+            sampler.stopped.set()
+            sampler.join()
+            sampler.sample()
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = sampler.peak_snapshot or tracemalloc.take_snapshot()
+            top_allocations = _top_allocations(snapshot, top)
+            if not already_tracing:
+                tracemalloc.stop()
+
+            report.update({
+                "task": task,
+                "timestamp": time.time(),
+                "duration_s": time.perf_counter() - start,
+                "peak_traced_bytes": peak - baseline_traced,
+                "retained_traced_bytes": current - baseline_traced,
+                "baseline_rss_bytes": baseline_rss,
+                "peak_rss_bytes": sampler.peak_rss,
+                "top_allocations": top_allocations,
+            })
+            recent_profiles.append(dict(report))
+
+
+def get_profiles(task=None, limit=20):
+    """Most recent profiles first, optionally only for one task."""
+    profiles = [p for p in reversed(recent_profiles) if task is None or p["task"] == task]
+    return profiles[:limit]
@@ -0,0 +1,329 @@
+"""Persistent full-text index with BM25 ranking over a directory of Markdown files.
+
+The index lives in a SQLite database: one row per document (path, mtime, size,
+length in tokens and H1 title), one row per term with its document frequency, and
+one posting per (term, document) with the term frequency, the token positions and
+the term's BM25 weight in that document. refresh() re-indexes only files whose
+mtime or size changed and drops deleted ones.
+
+Postings are indexed by (term, weight), so search() can walk each query term's
+postings best-first and stop as soon as no unseen document can beat the current
+top results (Fagin's threshold algorithm) instead of scoring every match; queries
+made only of very common terms fall back to scoring every match in SQL. Weights
+use the average document length at the time they were computed and are rebuilt
+when it drifts by more than AVERAGE_LENGTH_DRIFT.
+"""
+import collections
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from storage import file_lock
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVERAGE_LENGTH_DRIFT = 0.1
+TA_BATCH = 256
+TA_MAX_DOCUMENTS = 1024
+SNIPPET_BEFORE = 60
+SNIPPET_AFTER = 140
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER, size INTEGER, length INTEGER, title TEXT
+);
+CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, term TEXT UNIQUE NOT NULL, df INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL, weight REAL NOT NULL, positions TEXT NOT NULL
+);
+"""
+# Created after the first bulk load, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX IF NOT EXISTS postings_term ON postings (term_id, weight DESC, doc_id);
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id, term_id);
+"""
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+def first_h1(text):
+    """The first H1 heading, as extract_markdown_titles reads it."""
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("# "):
+            return line[2:].strip()
+    return None
+
+
+def bm25_weight(tf, length, average_length):
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+
+
+class SearchIndex:
+    def __init__(self, db_path, docs_dir):
+        self.db_path = db_path
+        self.docs_dir = os.path.abspath(docs_dir)
+        self.last_refresh = None
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if self._meta(conn, "docs_dir") != self.docs_dir:
+            # Indexed from another directory (or never): start over
+            conn.executescript("""
+                DROP INDEX IF EXISTS postings_term; DROP INDEX IF EXISTS postings_doc;
+                DELETE FROM postings; DELETE FROM terms; DELETE FROM docs; DELETE FROM meta;
+            """)
+            with conn:
+                self._set_meta(conn, docs_dir=self.docs_dir, documents=0, total_length=0)
+
+    def _connect(self):
+        """One connection per thread; WAL lets searches run while refresh() writes."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Closes this thread's connection, e.g. before the process forks."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _meta(conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    @staticmethod
+    def _set_meta(conn, **values):
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+
+    # 🔹 Indexing
+
+    def _scan(self):
+        """{relative path: (mtime_ns, size)} of every .md file under docs_dir."""
+        found = {}
+        stack = [self.docs_dir]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".md"):
+                    stat = entry.stat()
+                    relative = os.path.relpath(entry.path, self.docs_dir).replace(os.sep, "/")
+                    found[relative] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def _remove(self, conn, doc_ids, df_delta):
+        for doc_id in doc_ids:
+            for (term_id,) in conn.execute("SELECT term_id FROM postings WHERE doc_id = ?", (doc_id,)):
+                df_delta[term_id] -= 1
+            conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id in doc_ids])
+
+    def _add(self, conn, path, mtime_ns, size, average_length, term_ids, df_delta):
+        try:
+            with open(os.path.join(self.docs_dir, path), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return  # Deleted since the scan; the next refresh drops it
+        tokens = tokenize(text)
+        positions = {}
+        for i, token in enumerate(tokens):
+            positions.setdefault(token, []).append(i)
+
+        doc_id = conn.execute(
+            "INSERT INTO docs (path, mtime_ns, size, length, title) VALUES (?, ?, ?, ?, ?)",
+            (path, mtime_ns, size, len(tokens), first_h1(text))
+        ).lastrowid
+        new_terms = [term for term in positions if term not in term_ids]
+        if new_terms:
+            conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", [(term,) for term in new_terms])
+            for i in range(0, len(new_terms), 500):
+                chunk = new_terms[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                term_ids.update(conn.execute(f"SELECT term, id FROM terms WHERE term IN ({placeholders})", chunk))
+        df_delta.update(term_ids[term] for term in positions)
+        conn.executemany(
+            "INSERT INTO postings (term_id, doc_id, tf, weight, positions) VALUES (?, ?, ?, ?, ?)",
+            [(term_ids[term], doc_id, len(p), bm25_weight(len(p), len(tokens), average_length), json.dumps(p))
+             for term, p in positions.items()]
+        )
+
+    def _reweight(self, conn, average_length):
+        conn.create_function("bm25_weight", 3, bm25_weight, deterministic=True)
+        conn.execute("""
+            UPDATE postings SET weight = bm25_weight(tf, (SELECT length FROM docs WHERE docs.id = postings.doc_id), ?)
+        """, (average_length,))
+        self._set_meta(conn, weight_average_length=average_length)
+
+    def refresh(self):
+        """Brings the index up to date with docs_dir; returns what changed.
+
+        Refreshes are serialized across threads and worker processes sharing the database.
+        """
+        with self._refresh_lock, file_lock(self.db_path):
+            start = time.perf_counter()
+            found = self._scan()
+            conn = self._connect()
+            indexed = {path: (doc_id, mtime_ns, size) for doc_id, path, mtime_ns, size
+                       in conn.execute("SELECT id, path, mtime_ns, size FROM docs")}
+            removed = [path for path in indexed if path not in found]
+            changed = [path for path in found if path in indexed and indexed[path][1:] != found[path]]
+            added = [path for path in found if path not in indexed]
+
+            if removed or changed or added:
+                with conn:
+                    # Document frequencies are applied once at the end rather than per document
+                    df_delta = collections.Counter()
+                    weight_average_length = self._meta(conn, "weight_average_length") or 1
+                    self._remove(conn, [indexed[path][0] for path in removed + changed], df_delta)
+                    term_ids = {}
+                    for path in changed + added:
+                        self._add(conn, path, *found[path], weight_average_length, term_ids, df_delta)
+                    conn.executemany("UPDATE terms SET df = df + ? WHERE id = ?",
+                                     [(delta, term_id) for term_id, delta in df_delta.items() if delta])
+                    conn.execute("DELETE FROM terms WHERE df <= 0")
+
+                    documents, total_length = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+                    self._set_meta(conn, documents=documents, total_length=total_length)
+                    average_length = total_length / documents if documents else 1
+                    if abs(average_length - weight_average_length) > AVERAGE_LENGTH_DRIFT * weight_average_length:
+                        self._reweight(conn, average_length)
+                conn.executescript(INDEXES)
+            self.last_refresh = time.time()
+            return {
+                "added": len(added), "updated": len(changed), "removed": len(removed),
+                "documents": len(found), "seconds": time.perf_counter() - start,
+            }
+
+    # 🔹 Querying
+
+    def _snippet(self, path, positions):
+        try:
+            with open(os.path.join(self.docs_dir, path), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return None
+        offset = 0
+        for i, match in enumerate(TOKEN_PATTERN.finditer(text)):
+            if i == positions[0]:
+                offset = match.start()
+                break
+        start, end = max(0, offset - SNIPPET_BEFORE), offset + SNIPPET_AFTER
+        snippet = " ".join(text[start:end].split())
+        return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+    def _top_documents(self, conn, idf, limit):
+        """Threshold algorithm: read each term's postings best-first, fully score each new
+        document, and stop once the k-th best score beats anything still unseen.
+
+        Postings are read, and new documents scored, TA_BATCH at a time per term. When
+        the terms are so common that this hasn't converged after TA_MAX_DOCUMENTS, every
+        match is scored in one aggregate query instead.
+        """
+        term_ids = list(idf)
+        cursors = {
+            term_id: conn.execute("SELECT doc_id, weight FROM postings WHERE term_id = ? ORDER BY weight DESC", (term_id,))
+            for term_id in term_ids
+        }
+        frontier = dict.fromkeys(term_ids, 0.0)
+        seen = set()
+        top = []  # min-heap of (score, doc_id)
+        while cursors:
+            new_docs = {}
+            for term_id, cursor in list(cursors.items()):
+                rows = cursor.fetchmany(TA_BATCH)
+                if len(rows) < TA_BATCH:
+                    del cursors[term_id]
+                frontier[term_id] = rows[-1][1] if rows and term_id in cursors else 0.0
+                for doc_id, weight in rows:
+                    if doc_id not in seen:
+                        new_docs[doc_id] = idf[term_id] * weight
+            seen.update(new_docs)
+
+            if new_docs and len(term_ids) > 1:
+                # One query scores every new document on all query terms
+                scores = dict.fromkeys(new_docs, 0.0)
+                for doc_id, term_id, weight in conn.execute(f"""
+                    SELECT doc_id, term_id, weight FROM postings INDEXED BY postings_doc
+                    WHERE doc_id IN ({",".join("?" * len(new_docs))}) AND term_id IN ({",".join("?" * len(term_ids))})
+                """, list(new_docs) + term_ids):
+                    scores[doc_id] += idf[term_id] * weight
+                new_docs = scores
+            for doc_id, score in new_docs.items():
+                if len(top) < limit:
+                    heapq.heappush(top, (score, doc_id))
+                elif score > top[0][0]:
+                    heapq.heapreplace(top, (score, doc_id))
+            if len(top) >= limit and top[0][0] >= sum(idf[t] * frontier[t] for t in term_ids):
+                break
+            if len(seen) > TA_MAX_DOCUMENTS:
+                return self._score_all(conn, idf, limit)
+        return sorted(top, reverse=True)
+
+    def _score_all(self, conn, idf, limit):
+        cases = " ".join("WHEN ? THEN ?" for _ in idf)
+        return conn.execute(f"""
+            SELECT SUM((CASE term_id {cases} END) * weight) AS score, doc_id
+            FROM postings INDEXED BY postings_term WHERE term_id IN ({",".join("?" * len(idf))})
+            GROUP BY doc_id ORDER BY score DESC LIMIT ?
+        """, [value for item in idf.items() for value in item] + list(idf) + [limit]).fetchall()
+
+    def search(self, query, limit=10):
+        """Documents matching any query term, best BM25 score first, with titles and snippets."""
+        conn = self._connect()
+        documents = self._meta(conn, "documents", 0)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not documents:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        rows = conn.execute(f"SELECT id, df FROM terms WHERE term IN ({placeholders})", terms).fetchall()
+        if not rows:
+            return []
+        idf = {term_id: math.log(1 + (documents - df + 0.5) / (df + 0.5)) for term_id, df in rows}
+
+        # Snippets come from the rarest query term each document contains
+        rarest_first = sorted(idf, key=idf.get, reverse=True)
+        placeholders = ",".join("?" * len(rarest_first))
+        hits = []
+        for score, doc_id in self._top_documents(conn, idf, limit):
+            path, title = conn.execute("SELECT path, title FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            found = dict(conn.execute(
+                f"SELECT term_id, positions FROM postings WHERE doc_id = ? AND term_id IN ({placeholders})",
+                [doc_id] + rarest_first
+            ))
+            best = next(term_id for term_id in rarest_first if term_id in found)
+            hits.append({"path": path, "title": title, "score": score, "snippet": self._snippet(path, json.loads(found[best]))})
+        return hits
+
+    def stats(self):
+        conn = self._connect()
+        documents = self._meta(conn, "documents", 0)
+        terms = conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {
+            "documents": documents,
+            "terms": terms,
+            "average_length": self._meta(conn, "total_length", 0) / documents if documents else 0,
+            "last_refresh": self.last_refresh,
+        }
@@ -0,0 +1,110 @@
+"""Process-safe file writes for outputs and caches shared by several workers.
+
+atomic_write() writes to a temporary file next to the target and renames it into
+place, so readers (and other workers) only ever see the old or the new content,
+never a partial file. Writers to the same path are serialized with an flock()ed
+lock file under LOCK_DIR (TASK_LOCK_DIR, by default .cache/locks), which keeps the
+lock files out of the data directory (msvcrt.locking() on Windows). file_lock() on
+its own covers read-modify-write updates such as the JSON caches.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+LOCK_DIR = os.getenv("TASK_LOCK_DIR", os.path.join(".cache", "locks"))
+
+# mkstemp() creates files as 0600; outputs get the usual permissions instead
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+_held = threading.local()
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` across threads and processes; re-entrant within a thread."""
+    key = os.path.abspath(path)
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = set()
+    if key in held:
+        yield
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    lock_path = os.path.join(LOCK_DIR, hashlib.sha1(key.encode()).hexdigest() + ".lock")
+    with open(lock_path, "a+") as lock_file:
+        _lock(lock_file)
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            _unlock(lock_file)
+
+
+def _lock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    lock_file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass  # LK_LOCK gives up after about 10 seconds; keep waiting like flock()
+
+
+def _unlock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    lock_file.seek(0)
+    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8"):
+    """Opens a temporary file for writing that replaces `path` when the block succeeds."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with file_lock(path):
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with open(fd, mode, encoding=None if "b" in mode else encoding) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+            else:
+                os.chmod(temp_path, 0o666 & ~UMASK)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+def write_text(path, content):
+    with atomic_write(path) as f:
+        f.write(content)
+
+
+def write_json(path, data, **kwargs):
+    with atomic_write(path) as f:
+        json.dump(data, f, **kwargs)
+
@@ -0,0 +1,157 @@
+"""Shared executor for the external commands run by the task functions.
+
+Every command runs under a per-tool concurrency limit, a hard timeout that kills
+the whole process group, and a cap on how much stdout/stderr is kept in memory.
+Durations and outcomes are recorded per tool so slow or failing commands show up.
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from metrics import EXTERNAL_COMMAND_SECONDS, phase
+
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 300  # seconds
+DEFAULT_MAX_OUTPUT_BYTES = 1024 * 1024
+
+
+class SubprocessExecutor:
+    def __init__(self, limits=None, timeouts=None, max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES):
+        self.limits = dict(limits or {})
+        self.timeouts = dict(timeouts or {})
+        self.max_output_bytes = max_output_bytes
+        self._semaphores = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, tool):
+        with self._lock:
+            if tool not in self._semaphores:
+                self._semaphores[tool] = threading.BoundedSemaphore(self.limits.get(tool, DEFAULT_CONCURRENCY))
+            return self._semaphores[tool]
+
+    def _record(self, tool, seconds, outcome):
+        EXTERNAL_COMMAND_SECONDS.observe(seconds, tool=tool, outcome=outcome)
+        with self._lock:
+            stats = self._stats.setdefault(tool, {
+                "calls": 0, "failures": 0, "timeouts": 0,
+                "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0,
+            })
+            stats["calls"] += 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["last_seconds"] = seconds
+            if outcome == "timeout":
+                stats["timeouts"] += 1
+            elif outcome == "failure":
+                stats["failures"] += 1
+
+    def metrics(self):
+        """Returns a snapshot of per-tool call counts and durations."""
+        with self._lock:
+            return {
+                tool: {**stats, "avg_seconds": stats["total_seconds"] / stats["calls"]}
+                for tool, stats in self._stats.items()
+            }
+
+    def _drain(self, stream, chunks):
+        """Reads a pipe to EOF, keeping at most max_output_bytes of it."""
+        kept = 0
+        truncated = False
+        for chunk in iter(lambda: stream.read(65536), b""):
+            room = self.max_output_bytes - kept
+            if len(chunk) > room:
+                truncated = True
+                chunk = chunk[:room]
+            if chunk:
+                chunks.append(chunk)
+                kept += len(chunk)
+        if truncated:
+            chunks.append(b"\n... [output truncated]")
+        stream.close()
+
+    @staticmethod
+    def _kill(proc):
+        """Kills the process and everything it spawned (npx, node, pip, ...)."""
+        try:
+            if os.name == "nt":
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        proc.kill()
+
+    def run(self, cmd, tool=None, timeout=None, input=None, cwd=None, env=None, check=True):
+        """Runs `cmd` and returns a text-mode subprocess.CompletedProcess.
+
+        Raises subprocess.TimeoutExpired after killing the process group when the
+        timeout elapses, and subprocess.CalledProcessError on a non-zero exit if
+        `check` is set.
+        """
+        tool = tool or os.path.basename(cmd[0])
+        timeout = timeout or self.timeouts.get(tool, DEFAULT_TIMEOUT)
+
+        with phase("external"), self._semaphore(tool):
+            start = time.perf_counter()
+            outcome = "failure"
+            try:
+                if os.name == "nt":
+                    group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+                else:
+                    group = {"start_new_session": True}
+                proc = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    cwd=cwd,
+                    env=env,
+                    **group
+                )
+
+                stdout_chunks, stderr_chunks = [], []
+                readers = [
+                    threading.Thread(target=self._drain, args=(proc.stdout, stdout_chunks), daemon=True),
+                    threading.Thread(target=self._drain, args=(proc.stderr, stderr_chunks), daemon=True),
+                ]
+                for reader in readers:
+                    reader.start()
+
+                if input is not None:
+                    try:
+                        proc.stdin.write(input.encode("utf-8"))
+                    except BrokenPipeError:
+                        pass
+                    finally:
+                        proc.stdin.close()
+
+                try:
+                    proc.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    self._kill(proc)
+                    proc.wait()
+                    outcome = "timeout"
+                    raise
+                finally:
+                    for reader in readers:
+                        reader.join(timeout=5)
+
+                stdout = b"".join(stdout_chunks).decode("utf-8", errors="replace")
+                stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+                if check and proc.returncode != 0:
+                    raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+
+                outcome = "success"
+                return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+            finally:
+                self._record(tool, time.perf_counter() - start, outcome)
+
+
+executor = SubprocessExecutor(
+    limits={"pip": 1, "datagen": 2, "prettier": 2},
+    timeouts={"pip": 300, "datagen": 600, "prettier": 120},
+)
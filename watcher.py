@@ -0,0 +1,128 @@
+"""Watches a directory tree and reports changed files in debounced batches.
+
+DataWatcher uses inotify (through the optional inotify_simple package) where it is
+available and otherwise polls file mtimes and sizes. Every change is passed to
+`on_event` as soon as it is seen; `on_change` gets the set of changed paths
+(relative to the root, with "/" separators) once the tree has been quiet for
+`debounce` seconds, or after `max_delay` seconds of continuous changes.
+"""
+import os
+import threading
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+class DataWatcher:
+    def __init__(self, root, on_change, on_event=None, debounce=0.5, max_delay=5.0, poll_interval=1.0, use_inotify=None):
+        self.root = os.path.abspath(root)
+        self.on_change = on_change
+        self.on_event = on_event
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = inotify_simple is not None if use_inotify is None else use_inotify
+        self.stopped = threading.Event()
+        self._thread = None
+        self._pending = set()
+        self._first_change = None
+        self._last_change = None
+
+    @property
+    def backend(self):
+        return "inotify" if self.use_inotify else "polling"
+
+    def start(self):
+        target = self._run_inotify if self.use_inotify else self._run_polling
+        self._thread = threading.Thread(target=target, name="data-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self.stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _changed(self, paths):
+        if not paths:
+            return
+        now = time.monotonic()
+        self._pending.update(paths)
+        self._first_change = self._first_change or now
+        self._last_change = now
+        if self.on_event is not None:
+            self.on_event(set(paths))
+
+    def _flush_if_settled(self):
+        if not self._pending:
+            return
+        now = time.monotonic()
+        if now - self._last_change >= self.debounce or now - self._first_change >= self.max_delay:
+            changed, self._pending, self._first_change = self._pending, set(), None
+            try:
+                self.on_change(changed)
+            except Exception as e:
+                print(f"⚠️ Watcher callback failed: {e}")
+
+    # 🔹 inotify
+
+    def _run_inotify(self):
+        flags = inotify_simple.flags
+        mask = (flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO
+                | flags.ATTRIB | flags.DELETE_SELF)
+        watches = {}
+
+        def watch_tree(directory):
+            for dirpath, _, _ in os.walk(directory):
+                try:
+                    watches[inotify.add_watch(dirpath, mask)] = dirpath
+                except OSError:
+                    pass  # Removed while we were walking
+
+        with inotify_simple.INotify() as inotify:
+            watch_tree(self.root)
+            while not self.stopped.is_set():
+                changed = set()
+                for event in inotify.read(timeout=int(self.debounce * 1000)):
+                    directory = watches.get(event.wd)
+                    if directory is None:
+                        continue
+                    if event.mask & flags.IGNORED:
+                        watches.pop(event.wd, None)
+                        continue
+                    path = os.path.join(directory, event.name) if event.name else directory
+                    if event.mask & flags.ISDIR and event.mask & (flags.CREATE | flags.MOVED_TO):
+                        # Watch the new directory and report anything already written into it
+                        watch_tree(path)
+                        changed.update(self._relative(os.path.join(p, f)) for p, _, files in os.walk(path) for f in files)
+                    elif not event.mask & flags.ISDIR:
+                        changed.add(self._relative(path))
+                self._changed(changed)
+                self._flush_if_settled()
+
+    # 🔹 Polling fallback
+
+    def _snapshot(self):
+        snapshot = {}
+        for dirpath, _, files in os.walk(self.root):
+            for file in files:
+                path = os.path.join(dirpath, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[self._relative(path)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        while not self.stopped.wait(self.poll_interval):
+            current = self._snapshot()
+            self._changed({path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)})
+            previous = current
+            self._flush_if_settled()